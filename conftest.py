@@ -0,0 +1,63 @@
+"""Shared test helpers: a fake zero-shot classifier and the sample car database."""
+
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+SAMPLE_CARS = os.path.join(
+    os.path.dirname(__file__), "find_my_car", "data", "sample_cars.csv"
+)
+
+class FakeClassifier:
+    """
+    Stand-in for the zero-shot pipeline that is confident about some labels.
+
+    Every call is recorded. When `gate` is set to an Event, calls wait on it
+    so tests can hold the model busy, and `max_active` records the most calls
+    that ran at the same time. Texts in `fail` raise once.
+    """
+
+    def __init__(self, confident_labels=(), fail=()):
+        self.confident_labels = set(confident_labels)
+        self.fail = set(fail)
+        self.calls = []
+        self.gate = None
+        self.started = threading.Event()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    @property
+    def texts(self):
+        return [sequences for sequences, _ in self.calls]
+
+    def score(self, text, candidate_labels):
+        scores = [
+            0.9 if label in self.confident_labels else 0.1 for label in candidate_labels
+        ]
+        return {"sequence": text, "labels": list(candidate_labels), "scores": scores}
+
+    def __call__(self, sequences, candidate_labels, multi_label=False, batch_size=None):
+        with self.lock:
+            self.calls.append((sequences, tuple(candidate_labels)))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        self.started.set()
+        try:
+            if self.gate is not None:
+                assert self.gate.wait(timeout=10)
+            if isinstance(sequences, list):
+                return [self.score(text, candidate_labels) for text in sequences]
+            if sequences in self.fail:
+                self.fail.discard(sequences)
+                raise RuntimeError("model error")
+            return self.score(sequences, candidate_labels)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+@pytest.fixture
+def cars():
+    return pd.read_csv(SAMPLE_CARS)
@@ -1,16 +1,39 @@
 """Streamlit web interface for the car recommendation system."""
 
 import os
-from typing import Optional
+from typing import Dict, Optional, Tuple
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
 
-from find_my_car.recommender import load_classifier, get_car_recommendation
+from find_my_car.dataset_profile import NUMERIC_COLUMNS, build_profile
+from find_my_car.history import (
+    MAX_MESSAGES, MAX_SUMMARY_LINES, compact_history, model_memory_bytes,
+    read_limit, session_memory_bytes
+)
+from find_my_car.prefetch import PREFETCH_WORKERS, Prefetcher
+from find_my_car.recommender import (
+    CATEGORIES, load_classifier, get_conversational_recommendation
+)
 
 # Load environment variables
 load_dotenv()
 
+# Chat history window, configurable through the environment
+MAX_CHAT_MESSAGES = read_limit("MAX_CHAT_MESSAGES", MAX_MESSAGES)
+MAX_CHAT_SUMMARY_LINES = read_limit("MAX_CHAT_SUMMARY_LINES", MAX_SUMMARY_LINES)
+
+# Background threads used for speculative classification, shared by all sessions
+PREFETCH_THREADS = read_limit("PREFETCH_WORKERS", PREFETCH_WORKERS)
+
+# Session state entries counted towards per-session memory, re-measured
+# only when a new database is loaded or a chat turn completes
+DATASET_MEMORY_KEYS = ["df", "profile", "context"]
+CHAT_MEMORY_KEYS = ["messages", "history_summary", "context"]
+
+# Rows sent to the browser per page of the database view
+PAGE_SIZE = 100
+
 def load_csv(file) -> Optional[pd.DataFrame]:
     """Load and validate a CSV file containing car data."""
     try:
@@ -24,31 +47,93 @@ def load_csv(file) -> Optional[pd.DataFrame]:
         if missing_columns:
             st.error(f"Missing required columns: {', '.join(missing_columns)}")
             return None
+        
+        if df.empty:
+            st.error("The CSV file has no cars in it")
+            return None
+        
+        non_numeric_columns = [
+            col for col in NUMERIC_COLUMNS if not pd.api.types.is_numeric_dtype(df[col])
+        ]
+        if non_numeric_columns:
+            st.error(
+                f"Columns must contain plain numbers: {', '.join(non_numeric_columns)}"
+            )
+            return None
             
         return df
     except Exception as e:
         st.error(f"Error loading CSV file: {str(e)}")
         return None
 
-def format_car_features(df: pd.DataFrame) -> str:
+def format_range(value_range: Optional[Tuple], template: str, unit: str = "") -> str:
+    """Format a (min, max) range, which is None when a column has no values."""
+    if value_range is None:
+        return "unknown"
+    low, high = (template.format(value) for value in value_range)
+    return f"{low} - {high}{unit}"
+
+def format_car_features(profile: Dict) -> str:
     """Format car features for display."""
-    features = {
-        'body_types': df['body_type'].unique().tolist(),
-        'fuel_types': df['fuel_type'].unique().tolist(),
-        'transmission_types': df['transmission_type'].unique().tolist(),
-        'price_range': (float(df['cost'].min()), float(df['cost'].max())),
-        'age_range': (int(df['age'].min()), int(df['age'].max())),
-        'mileage_range': (float(df['mileage'].min()), float(df['mileage'].max()))
-    }
+    counts = profile["counts"]
+    ranges = profile["ranges"]
     
     return (
-        f"- Body types: {', '.join(features['body_types'])}\n"
-        f"- Fuel types: {', '.join(features['fuel_types'])}\n"
-        f"- Transmission types: {', '.join(features['transmission_types'])}\n"
-        f"- Price range: £{features['price_range'][0]:,.2f} - £{features['price_range'][1]:,.2f}\n"
-        f"- Age range: {features['age_range'][0]} - {features['age_range'][1]} years\n"
-        f"- Mileage range: {features['mileage_range'][0]:,.0f} - {features['mileage_range'][1]:,.0f} miles"
+        f"- Body types: {', '.join(map(str, counts['body_type']))}\n"
+        f"- Fuel types: {', '.join(map(str, counts['fuel_type']))}\n"
+        f"- Transmission types: {', '.join(map(str, counts['transmission_type']))}\n"
+        f"- Price range: {format_range(ranges['cost'], '£{:,.2f}')}\n"
+        f"- Age range: {format_range(ranges['age'], '{:.0f}', ' years')}\n"
+        f"- Mileage range: {format_range(ranges['mileage'], '{:,.0f}', ' miles')}"
+    )
+
+def show_dataframe_page(df: pd.DataFrame) -> None:
+    """Display one page of the car database."""
+    pages = max(1, -(-len(df) // PAGE_SIZE))
+    page = 1
+    if pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+    start = (page - 1) * PAGE_SIZE
+    end = min(start + PAGE_SIZE, len(df))
+    
+    st.dataframe(
+        df.iloc[start:end],
+        use_container_width=True,
+        hide_index=True
     )
+    st.caption(f"Showing cars {start + 1:,} - {end:,} of {len(df):,}")
+
+@st.cache_resource(show_spinner=False)
+def shared_classifier():
+    """Load the model once and share it between all sessions."""
+    return load_classifier()
+
+@st.cache_resource(show_spinner=False)
+def shared_model_bytes() -> int:
+    """Measure the shared model's weights once."""
+    return model_memory_bytes(shared_classifier())
+
+def submit_draft():
+    """Send the draft message and clear the input box."""
+    st.session_state.pending_prompt = st.session_state.draft
+    st.session_state.draft = ""
+
+def speculative_input(prefetcher: Prefetcher) -> Optional[str]:
+    """
+    Message input that starts classifying a draft before it is sent.
+
+    Streamlit only sends the draft to the server when Enter is pressed, so
+    that starts the speculative classification; the Send button submits it.
+    """
+    draft = st.text_input(
+        "Ask about your ideal car...",
+        key="draft",
+        help="Press Enter to start analysing your message, then click Send"
+    )
+    if draft:
+        prefetcher.prefetch(draft, CATEGORIES)
+    st.button("Send", on_click=submit_draft)
+    return st.session_state.pop("pending_prompt", None) or None
 
 def main():
     """Main Streamlit application."""
@@ -61,12 +146,27 @@ def main():
     # Initialize session state
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "history_summary" not in st.session_state:  # One line per compacted message
+        st.session_state.history_summary = []
     if "df" not in st.session_state:
         st.session_state.df = None
+    if "dataset_key" not in st.session_state:
+        st.session_state.dataset_key = None
+    if "rejected_key" not in st.session_state:  # Last upload that failed to load
+        st.session_state.rejected_key = None
+    if "profile" not in st.session_state:  # Summary statistics of the database
+        st.session_state.profile = None
+    if "context" not in st.session_state:  # Previous turn's requirements and candidates
+        st.session_state.context = None
+    if "memory_usage" not in st.session_state:  # Bytes used by each measured entry
+        st.session_state.memory_usage = {}
     if "classifier" not in st.session_state:
         with st.spinner("Loading model... this may take a few minutes"):
             try:
-                st.session_state.classifier = load_classifier()
+                st.session_state.classifier = shared_classifier()
+                st.session_state.prefetcher = Prefetcher(
+                    st.session_state.classifier, PREFETCH_THREADS
+                )
             except Exception as e:
                 st.error(f"Error loading model: {str(e)}")
                 st.stop()
@@ -80,29 +180,63 @@ def main():
     )
 
     if uploaded_file is not None:
-        df = load_csv(uploaded_file)
-        if df is not None:
-            st.session_state.df = df
+        # Only read and profile the file when a different one is uploaded
+        dataset_key = uploaded_file.file_id
+        known_keys = (st.session_state.dataset_key, st.session_state.rejected_key)
+        if dataset_key not in known_keys:
+            df = load_csv(uploaded_file)
+            if df is not None:
+                st.session_state.df = df
+                st.session_state.profile = build_profile(df)
+                st.session_state.dataset_key = dataset_key
+                st.session_state.rejected_key = None
+            else:
+                # Don't keep answering from a database the user tried to replace
+                st.session_state.df = None
+                st.session_state.profile = None
+                st.session_state.dataset_key = None
+                st.session_state.rejected_key = dataset_key
+            # A different database invalidates the cached candidates
+            st.session_state.context = None
+            st.session_state.memory_usage.update(
+                session_memory_bytes(st.session_state, DATASET_MEMORY_KEYS)
+            )
+        elif st.session_state.rejected_key == dataset_key:
+            st.error("This file couldn't be loaded. Please upload a valid car database")
+        
+        if st.session_state.dataset_key == dataset_key:
             st.success("CSV file loaded successfully!")
             
             # Display the dataframe
             st.subheader("Current Car Database")
-            st.dataframe(
-                df,
-                use_container_width=True,
-                hide_index=True
-            )
+            st.markdown(format_car_features(st.session_state.profile))
+            show_dataframe_page(st.session_state.df)
 
     # Chat interface
     st.subheader("Chat with Car Assistant")
 
+    # Older messages are only shown as a summary
+    if st.session_state.history_summary:
+        with st.expander("Earlier in this conversation"):
+            summary = st.session_state.history_summary
+            st.markdown("\n".join(f"- {line}" for line in summary))
+
     # Display chat messages
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
     # Chat input
-    if prompt := st.chat_input("Ask about your ideal car..."):
+    speculative = st.sidebar.toggle(
+        "Speculative mode",
+        help="Start analysing your message before you send it"
+    )
+    if speculative:
+        prompt = speculative_input(st.session_state.prefetcher)
+    else:
+        prompt = st.chat_input("Ask about your ideal car...")
+
+    if prompt:
         if st.session_state.df is None:
             st.error("Please upload a car database first!")
         else:
@@ -116,15 +250,38 @@ def main():
             # Get and display assistant response
             with st.chat_message("assistant"):
                 with st.spinner("Finding the best matches..."):
-                    response = get_car_recommendation(
-                        st.session_state.classifier,
+                    # Always go through the prefetcher so every session's
+                    # real requests pause speculation in the others
+                    response, context = get_conversational_recommendation(
+                        st.session_state.prefetcher,
                         prompt,
-                        st.session_state.df
+                        st.session_state.df,
+                        st.session_state.context
                     )
+                    st.session_state.context = context
                     st.markdown(response)
                 
             # Add assistant response to chat history
             st.session_state.messages.append({"role": "assistant", "content": response})
+            compact_history(
+                st.session_state.messages,
+                st.session_state.history_summary,
+                MAX_CHAT_MESSAGES,
+                MAX_CHAT_SUMMARY_LINES
+            )
+            st.session_state.memory_usage.update(
+                session_memory_bytes(st.session_state, CHAT_MEMORY_KEYS)
+            )
+
+    # Per-session memory usage; the model is shared, so it is reported separately
+    memory = st.session_state.memory_usage
+    st.sidebar.metric("Session memory", f"{sum(memory.values()) / 1024:,.1f} KB")
+    st.sidebar.caption(
+        ", ".join(f"{key}: {size / 1024:,.1f} KB" for key, size in memory.items())
+    )
+    st.sidebar.caption(
+        f"Model (shared by all sessions): {shared_model_bytes() / 1024 ** 2:,.0f} MB"
+    )
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Offline calibration of the per-category classification thresholds.
+
+Runs the classifier over a labelled set of queries, caches the raw scores on
+disk, fits one threshold per category and writes the config that
+`generate_response` loads. Scores already in the cache are not recomputed, so
+re-tuning on the same queries does not load the model at all. The calibrated
+thresholds are reported with cross-validation, so each query is scored by
+thresholds fitted without it.
+
+Usage:
+    python -m find_my_car.calibrate find_my_car/data/sample_queries.csv
+"""
+
+import argparse
+import json
+import os
+import random
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from find_my_car.recommender import (
+    CATEGORIES, CONFIDENCE_THRESHOLD, DEFAULT_THRESHOLDS_PATH, MODEL_NAME,
+    filter_cars, load_classifier, select_requirements
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# Thresholds tried for each category
+CANDIDATE_THRESHOLDS = [round(0.05 + 0.01 * i, 2) for i in range(91)]
+
+def load_labelled_queries(path: str) -> List[Tuple[str, List[str]]]:
+    """
+    Load labelled queries from a CSV file.
+
+    The file needs a `query` column and a `labels` column holding the expected
+    categories separated by semicolons (empty when none apply).
+    """
+    df = pd.read_csv(path, keep_default_na=False)
+    queries = []
+    for _, row in df.iterrows():
+        labels = [label.strip() for label in row["labels"].split(";") if label.strip()]
+        unknown = [label for label in labels if label not in CATEGORIES]
+        if unknown:
+            raise ValueError(
+                f"Unknown categories for {row['query']!r}: {', '.join(unknown)}"
+            )
+        queries.append((row["query"], labels))
+    return queries
+
+def cache_key(model: str, candidate_labels: List[str]) -> str:
+    """Key cached scores by the model and label set they were computed with."""
+    return f"{model}|{';'.join(candidate_labels)}"
+
+def score_queries(
+    queries: List[str], cache_path: str, classifier=None, batch_size: int = 8,
+    model: str = MODEL_NAME
+) -> Dict[str, Dict[str, float]]:
+    """
+    Get the raw classifier scores for each query, using the on-disk cache.
+
+    Only queries missing from the cache for this model and set of categories
+    are classified, in batches, and the model is only loaded when there is
+    something to classify.
+    """
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict):
+                raise ValueError("expected a JSON object")
+        except (OSError, ValueError) as e:
+            warnings.warn(
+                f"Ignoring invalid score cache {cache_path}: {e!r}", stacklevel=2
+            )
+            cache = {}
+    cached = cache.setdefault(cache_key(model, CATEGORIES), {})
+
+    missing = [query for query in dict.fromkeys(queries) if query not in cached]
+    if missing:
+        if classifier is None:
+            print("Loading classifier...")
+            classifier = load_classifier()
+        print(f"Classifying {len(missing)} queries...")
+        results = classifier(
+            missing,
+            candidate_labels=CATEGORIES,
+            multi_label=True,
+            batch_size=batch_size
+        )
+        for query, result in zip(missing, results):
+            cached[query] = dict(zip(result["labels"], result["scores"]))
+
+        with open(cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+
+    return {query: cached[query] for query in queries}
+
+def fit_thresholds(
+    scores: Dict[str, Dict[str, float]], labelled: List[Tuple[str, List[str]]]
+) -> Dict[str, float]:
+    """
+    Pick the threshold with the best F1 score for each category.
+
+    Ties go to the threshold closest to the default, and categories with no
+    positive examples keep the default.
+    """
+    thresholds = {}
+    for label in CATEGORIES:
+        expected = [label in labels for _, labels in labelled]
+        label_scores = [scores[query][label] for query, _ in labelled]
+        if not any(expected):
+            thresholds[label] = CONFIDENCE_THRESHOLD
+            continue
+
+        best = None
+        for threshold in CANDIDATE_THRESHOLDS:
+            predicted = [score > threshold for score in label_scores]
+            f1 = f1_score(expected, predicted)
+            key = (f1, -abs(threshold - CONFIDENCE_THRESHOLD))
+            if best is None or key > best[0]:
+                best = (key, threshold)
+        thresholds[label] = best[1]
+    return thresholds
+
+def precision_recall(
+    expected: List[bool], predicted: List[bool]
+) -> Tuple[float, float]:
+    """Compute precision and recall for one category."""
+    true_positives = sum(e and p for e, p in zip(expected, predicted))
+    precision = true_positives / sum(predicted) if any(predicted) else 0.0
+    recall = true_positives / sum(expected) if any(expected) else 0.0
+    return precision, recall
+
+def f1_score(expected: List[bool], predicted: List[bool]) -> float:
+    """Compute the F1 score for one category."""
+    precision, recall = precision_recall(expected, predicted)
+    if precision + recall == 0:
+        return 0.0
+    return 2 * precision * recall / (precision + recall)
+
+def evaluate_selections(
+    labelled: List[Tuple[str, List[str]]],
+    selected: List[List[str]],
+    thresholds: Dict[str, float],
+    df: Optional[pd.DataFrame] = None
+) -> Dict:
+    """
+    Measure per-category precision/recall and the end-to-end retry rate.
+
+    A query counts as a retry when no category is identified, or when the
+    identified categories leave no cars in df.
+    """
+    report = {"labels": {}}
+    for label in CATEGORIES:
+        expected = [label in labels for _, labels in labelled]
+        predicted = [label in requirements for requirements in selected]
+        precision, recall = precision_recall(expected, predicted)
+        report["labels"][label] = {
+            "threshold": thresholds[label],
+            "precision": precision,
+            "recall": recall,
+            "support": sum(expected)
+        }
+
+    retries = 0
+    for requirements in selected:
+        if not requirements or (df is not None and filter_cars(df, requirements).empty):
+            retries += 1
+    report["retry_rate"] = retries / len(labelled) if labelled else 0.0
+    return report
+
+def evaluate(
+    scores: Dict[str, Dict[str, float]],
+    labelled: List[Tuple[str, List[str]]],
+    thresholds: Dict[str, float],
+    df: Optional[pd.DataFrame] = None
+) -> Dict:
+    """Evaluate fixed thresholds on the labelled queries."""
+    selected = [select_requirements(scores[query], thresholds) for query, _ in labelled]
+    return evaluate_selections(labelled, selected, thresholds, df)
+
+def cross_validate(
+    scores: Dict[str, Dict[str, float]],
+    labelled: List[Tuple[str, List[str]]],
+    folds: int = 5,
+    df: Optional[pd.DataFrame] = None,
+    seed: int = 0
+) -> Dict:
+    """
+    Evaluate threshold fitting on queries the fit did not see.
+
+    The queries are split into folds; each fold is scored with thresholds
+    fitted on the other folds, and the metrics are pooled over all folds.
+    The report lists the thresholds fitted on every query and the number of
+    folds used, which is capped by the number of queries.
+    """
+    folds = max(2, min(folds, len(labelled)))
+    order = list(range(len(labelled)))
+    random.Random(seed).shuffle(order)
+    fold_of = {index: position % folds for position, index in enumerate(order)}
+
+    selected = [None] * len(labelled)
+    for fold in range(folds):
+        train = [item for i, item in enumerate(labelled) if fold_of[i] != fold]
+        thresholds = fit_thresholds(scores, train)
+        for i, (query, _) in enumerate(labelled):
+            if fold_of[i] == fold:
+                selected[i] = select_requirements(scores[query], thresholds)
+
+    thresholds = fit_thresholds(scores, labelled)
+    report = evaluate_selections(labelled, selected, thresholds, df)
+    report["folds"] = folds
+    return report
+
+def format_report(report: Dict) -> str:
+    """Format an evaluation report as a table."""
+    lines = [
+        f"{'category':<16} {'threshold':>9} {'precision':>9} "
+        f"{'recall':>9} {'support':>7}"
+    ]
+    for label, stats in report["labels"].items():
+        lines.append(
+            f"{label:<16} {stats['threshold']:>9.2f} {stats['precision']:>9.2f} "
+            f"{stats['recall']:>9.2f} {stats['support']:>7}"
+        )
+    lines.append(f"Retry rate: {report['retry_rate']:.1%}")
+    return "\n".join(lines)
+
+def write_thresholds(path: str, thresholds: Dict[str, float], report: Dict) -> None:
+    """Write the thresholds config loaded by the recommender, with its scores."""
+    labels = report["labels"]
+    config = {
+        "thresholds": thresholds,
+        "evaluation": {
+            "folds": report.get("folds"),
+            "precision": {label: stats["precision"] for label, stats in labels.items()},
+            "recall": {label: stats["recall"] for label, stats in labels.items()},
+            "retry_rate": report["retry_rate"]
+        }
+    }
+    with open(path, "w") as f:
+        json.dump(config, f, indent=2)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Calibrate the thresholds from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("queries", help="CSV file with query and labels columns")
+    parser.add_argument(
+        "--scores", default=os.path.join(DATA_DIR, "query_scores.json"),
+        help="JSON cache of raw classifier scores"
+    )
+    parser.add_argument(
+        "--output", default=DEFAULT_THRESHOLDS_PATH,
+        help="Where to write the thresholds config"
+    )
+    parser.add_argument(
+        "--cars", default=os.path.join(DATA_DIR, "sample_cars.csv"),
+        help="Car database used to measure the retry rate"
+    )
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument(
+        "--folds", type=int, default=5,
+        help="Number of cross-validation folds for the calibrated report"
+    )
+    args = parser.parse_args(argv)
+
+    labelled = load_labelled_queries(args.queries)
+    queries = [query for query, _ in labelled]
+    scores = score_queries(queries, args.scores, batch_size=args.batch_size)
+    df = pd.read_csv(args.cars)
+
+    default = {label: CONFIDENCE_THRESHOLD for label in CATEGORIES}
+    print("\nDefault thresholds:")
+    print(format_report(evaluate(scores, labelled, default, df)))
+
+    thresholds = fit_thresholds(scores, labelled)
+    report = cross_validate(scores, labelled, args.folds, df)
+    print(f"\nCalibrated thresholds ({report['folds']}-fold cross-validated):")
+    print(format_report(report))
+
+    write_thresholds(args.output, thresholds, report)
+    print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Summary statistics for a car database, computed once per dataset."""
+
+from typing import Dict
+
+import pandas as pd
+
+CATEGORY_COLUMNS = ["body_type", "fuel_type", "transmission_type"]
+
+# Numeric columns and the histogram bin width used for each
+NUMERIC_COLUMNS = {"cost": 5000, "age": 1, "mileage": 10000}
+
+def empty_profile() -> Dict:
+    """Create a profile for a database with no cars."""
+    return {
+        "rows": 0,
+        "counts": {column: {} for column in CATEGORY_COLUMNS},
+        "ranges": {column: None for column in NUMERIC_COLUMNS},
+        "histograms": {column: {} for column in NUMERIC_COLUMNS}
+    }
+
+def update_profile(profile: Dict, df: pd.DataFrame) -> Dict:
+    """
+    Add the cars in df to an existing profile, in place.
+
+    Counts and fixed-width histogram bins are summed and ranges are widened,
+    so new rows can be folded in without rescanning the cars already profiled.
+    """
+    if df.empty:
+        return profile
+    profile["rows"] += len(df)
+
+    # Per-category counts, in order of first appearance
+    for column in CATEGORY_COLUMNS:
+        counts = profile["counts"][column]
+        for value, count in df[column].value_counts(sort=False).to_dict().items():
+            counts[value] = counts.get(value, 0) + int(count)
+
+    for column, width in NUMERIC_COLUMNS.items():
+        values = df[column].dropna()
+        if values.empty:
+            continue
+        low, high = float(values.min()), float(values.max())
+        if profile["ranges"][column] is not None:
+            low = min(low, profile["ranges"][column][0])
+            high = max(high, profile["ranges"][column][1])
+        profile["ranges"][column] = (low, high)
+
+        # Bins are keyed by their lower edge
+        histogram = profile["histograms"][column]
+        bins = (values // width * width).value_counts(sort=False).to_dict()
+        for edge, count in bins.items():
+            histogram[edge] = histogram.get(edge, 0) + int(count)
+
+    return profile
+
+def build_profile(df: pd.DataFrame) -> Dict:
+    """Profile a whole car database."""
+    return update_profile(empty_profile(), df)
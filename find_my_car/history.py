@@ -0,0 +1,102 @@
+"""Bounded chat history and session memory accounting."""
+
+import itertools
+import os
+import sys
+import warnings
+from typing import Dict, List
+
+import pandas as pd
+
+# Number of recent messages kept in full
+MAX_MESSAGES = 20
+
+# Number of one-line summaries kept for older messages
+MAX_SUMMARY_LINES = 50
+
+SUMMARY_TEXT_LENGTH = 80
+
+def read_limit(name: str, default: int) -> int:
+    """Read a positive integer limit from the environment, falling back to default."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        warnings.warn(
+            f"Ignoring invalid {name}={value!r}, using {default}", stacklevel=2
+        )
+        return default
+    return limit
+
+def summarize_message(message: Dict[str, str]) -> str:
+    """Condense a chat message into a single line."""
+    content = message["content"] or ""
+    if message["role"] == "user":
+        text = " ".join(content.split())
+        if len(text) > SUMMARY_TEXT_LENGTH:
+            text = text[:SUMMARY_TEXT_LENGTH - 3] + "..."
+        return f"You asked: {text}"
+
+    # Assistant replies start with the identified categories as "- " lines
+    categories = []
+    for line in content.split("\n")[1:]:
+        if not line.startswith("- "):
+            break
+        categories.append(line[2:].strip())
+    if categories:
+        return f"Assistant identified: {', '.join(categories)}"
+    first_line = content.split("\n", 1)[0]
+    return f"Assistant: {first_line[:SUMMARY_TEXT_LENGTH]}"
+
+def compact_history(
+    messages: List[Dict[str, str]],
+    summary: List[str],
+    max_messages: int = MAX_MESSAGES,
+    max_summary_lines: int = MAX_SUMMARY_LINES
+) -> None:
+    """
+    Move messages beyond the window into the summary, in place.
+
+    Only the most recent `max_messages` messages are kept in full. Older ones
+    are replaced by one-line summaries, and the oldest summaries are dropped
+    once there are more than `max_summary_lines` of them.
+    """
+    overflow = len(messages) - max_messages
+    if overflow > 0:
+        summary.extend(summarize_message(message) for message in messages[:overflow])
+        del messages[:overflow]
+    if len(summary) > max_summary_lines:
+        del summary[:len(summary) - max_summary_lines]
+
+def estimate_size(obj) -> int:
+    """Approximate the memory used by an object in bytes."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_size(key) + estimate_size(value) for key, value in obj.items()
+        )
+    if isinstance(obj, (list, tuple, set)):
+        return sys.getsizeof(obj) + sum(estimate_size(item) for item in obj)
+    return sys.getsizeof(obj)
+
+def session_memory_bytes(state, keys: List[str]) -> Dict[str, int]:
+    """
+    Measure the memory used by the given session state entries.
+
+    This walks every value (including each string in a DataFrame), so call it
+    when the entries change rather than on every rerun.
+    """
+    return {key: estimate_size(state[key]) for key in keys if key in state}
+
+def model_memory_bytes(classifier) -> int:
+    """Approximate the memory held by a pipeline's model weights."""
+    model = getattr(classifier, "model", None)
+    if model is None:
+        return 0
+    tensors = itertools.chain(model.parameters(), model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
@@ -0,0 +1,171 @@
+"""Speculative classification of draft messages in the background."""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# Speculative jobs run on at most this many threads in the whole process
+PREFETCH_WORKERS = 1
+
+# Labels scored per model call by a speculative job, which can only give way
+# to real requests between calls
+LABELS_PER_STEP = 2
+
+# Shared by every session, so speculation is capped and paused process-wide
+shared_lock = threading.Lock()
+shared_state = {"executor": None, "real_requests": 0}
+
+# Held while a speculative step runs; real requests wait for it to be free
+speculation_lock = threading.Lock()
+
+def shared_executor(max_workers: int = PREFETCH_WORKERS) -> ThreadPoolExecutor:
+    """Get the thread pool used for speculation; the first caller sets its size."""
+    with shared_lock:
+        if shared_state["executor"] is None:
+            shared_state["executor"] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="prefetch"
+            )
+        return shared_state["executor"]
+
+def real_requests_in_flight() -> int:
+    """Count the submitted messages being classified in this process."""
+    with shared_lock:
+        return shared_state["real_requests"]
+
+def prefetch_key(text: str, candidate_labels: List[str], multi_label: bool) -> Tuple:
+    """Identify a classification request by its exact text."""
+    return (text.strip(), tuple(candidate_labels), multi_label)
+
+class Prefetcher:
+    """
+    Wrap a classifier so draft messages can be classified ahead of time.
+
+    Calling the prefetcher works like calling the classifier. When the same
+    text was prefetched and its job has started, the job is claimed and its
+    result reused; a job still waiting for a worker is cancelled and the
+    message is classified directly. Only the latest draft is kept, and older
+    jobs that already started stop at their next step.
+
+    Speculative jobs score a few labels per model call and never run a call
+    at the same time as a real request: no step starts while any session in
+    the process has a real request in flight, and a real request waits for
+    the step in progress (a fraction of one pass) before using the model.
+    An unclaimed job stops at its next step once a real request arrives.
+    """
+
+    def __init__(self, classifier, max_workers: int = PREFETCH_WORKERS):
+        self.classifier = classifier
+        self.executor = shared_executor(max_workers)
+        self.jobs: Dict[Tuple, Tuple[Future, threading.Event, threading.Event]] = {}
+        self.lock = threading.Lock()
+
+    def prefetch(
+        self, text: str, candidate_labels: List[str], multi_label: bool = True
+    ) -> None:
+        """Start classifying a draft message in the background."""
+        key = prefetch_key(text, candidate_labels, multi_label)
+        if not key[0]:
+            return
+        with self.lock:
+            if key in self.jobs:
+                return
+            self.cancel_stale(key)
+            if real_requests_in_flight():
+                return
+            claimed = threading.Event()
+            stopped = threading.Event()
+            job = self.executor.submit(
+                self.run_speculative,
+                text,
+                candidate_labels,
+                multi_label,
+                claimed,
+                stopped
+            )
+            self.jobs[key] = (job, claimed, stopped)
+
+    def run_speculative(
+        self,
+        text: str,
+        candidate_labels: List[str],
+        multi_label: bool,
+        claimed: threading.Event,
+        stopped: threading.Event
+    ) -> Optional[Dict]:
+        """
+        Classify a draft a few labels at a time, giving way to real requests.
+
+        With multi_label each label is scored on its own, so scoring the labels
+        in steps gives the same result as one call. Returns None if the draft
+        went stale, or a real request arrived before it was submitted.
+        """
+        steps = [candidate_labels]
+        if multi_label:
+            steps = [
+                candidate_labels[i:i + LABELS_PER_STEP]
+                for i in range(0, len(candidate_labels), LABELS_PER_STEP)
+            ]
+
+        scores = {}
+        for labels in steps:
+            with speculation_lock:
+                if stopped.is_set():
+                    return None
+                if real_requests_in_flight() and not claimed.is_set():
+                    return None
+                result = self.classifier(
+                    sequences=text,
+                    candidate_labels=labels,
+                    multi_label=multi_label
+                )
+            scores.update(zip(result["labels"], result["scores"]))
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "sequence": text,
+            "labels": [label for label, _ in ranked],
+            "scores": [score for _, score in ranked]
+        }
+
+    def cancel_stale(self, key: Tuple) -> None:
+        """Drop every job except the one for key; the lock must be held."""
+        for other in [other for other in self.jobs if other != key]:
+            job, _, stopped = self.jobs.pop(other)
+            job.cancel()
+            stopped.set()
+
+    def __call__(
+        self, sequences: str, candidate_labels: List[str], multi_label: bool = False
+    ) -> Dict:
+        """Classify a submitted message, reusing a matching prefetched result."""
+        key = prefetch_key(sequences, candidate_labels, multi_label)
+        with self.lock:
+            self.cancel_stale(key)
+            entry = self.jobs.pop(key, None)
+        with shared_lock:
+            shared_state["real_requests"] += 1
+
+        try:
+            if entry is not None:
+                job, claimed, _ = entry
+                claimed.set()
+                # cancel() only succeeds for a job still waiting for a worker
+                if not job.cancel():
+                    try:
+                        result = job.result()
+                    except Exception:
+                        result = None
+                    if result is not None:
+                        return result
+
+            # Wait for any speculative step in progress to finish
+            with speculation_lock:
+                pass
+            return self.classifier(
+                sequences=sequences,
+                candidate_labels=candidate_labels,
+                multi_label=multi_label
+            )
+        finally:
+            with shared_lock:
+                shared_state["real_requests"] -= 1
@@ -1,54 +1,131 @@
 """Car recommendation system using transformer models."""
 
+import json
 import os
-from typing import List, Optional
+import re
+import warnings
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 import pandas as pd
 from transformers import pipeline
 
+MODEL_NAME = "facebook/bart-large-mnli"
+
+# Car categories/features to check user queries against
+CATEGORIES = [
+    "family car", "long distance", "durable", "fuel efficient",
+    "luxury", "sporty", "budget friendly", "compact"
+]
+
+CONFIDENCE_THRESHOLD = 0.7
+
+# Per-category thresholds written by `python -m find_my_car.calibrate`
+DEFAULT_THRESHOLDS_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "thresholds.json"
+)
+
+UNCLEAR_MESSAGE = (
+    "I couldn't clearly identify your car preferences. Could you please be more "
+    "specific about what you're looking for in a car?"
+)
+
+NO_MATCHES_MESSAGE = (
+    "I couldn't find any cars matching all your requirements. "
+    "Try broadening your search criteria."
+)
+
+# Comparatives that mark a message as a follow-up to the previous recommendation,
+# with the column and direction each one re-ranks the previous matches by
+REFINEMENT_CUES = {
+    "cheaper": ("cost", True),
+    "cheapest": ("cost", True),
+    "newer": ("age", True),
+    "newest": ("age", True),
+    "smaller": ("size", True),
+    "smallest": ("size", True),
+    "bigger": ("size", False),
+    "biggest": ("size", False),
+    "larger": ("size", False),
+    "largest": ("size", False)
+}
+
+# Relative size of each body type, used to rank by "smaller" or "bigger"
+BODY_SIZES = {"hatchback": 0, "sedan": 1, "wagon": 2, "suv": 3}
+
 def load_classifier():
     """Load the zero-shot classification model."""
     return pipeline(
         "zero-shot-classification",
-        model="facebook/bart-large-mnli",
+        model=MODEL_NAME,
         token=os.getenv("HF_TOKEN")
     )
 
+def classify_requirements(classifier, prompt: str) -> Dict[str, float]:
+    """Score the prompt against every car category, highest score first."""
+    result = classifier(
+        sequences=prompt,
+        candidate_labels=CATEGORIES,
+        multi_label=True
+    )
+    return dict(zip(result["labels"], result["scores"]))
+
+@lru_cache(maxsize=8)
+def read_thresholds(path: str, modified: float) -> Dict[str, float]:
+    """
+    Read per-category thresholds from a JSON config file.
+    
+    Cached per modification time, so a rewritten file is picked up.
+    """
+    try:
+        with open(path) as f:
+            config = json.load(f)
+        return {label: float(value) for label, value in config["thresholds"].items()}
+    except (OSError, ValueError, TypeError, KeyError, AttributeError) as e:
+        warnings.warn(f"Ignoring invalid thresholds file {path}: {e!r}", stacklevel=2)
+        return {}
+
+def load_thresholds() -> Dict[str, float]:
+    """Load the configured per-category thresholds, falling back to the default."""
+    path = os.getenv("FIND_MY_CAR_THRESHOLDS", DEFAULT_THRESHOLDS_PATH)
+    thresholds = {}
+    if os.path.exists(path):
+        thresholds = read_thresholds(path, os.path.getmtime(path))
+    return {label: thresholds.get(label, CONFIDENCE_THRESHOLD) for label in CATEGORIES}
+
+def select_requirements(
+    scores: Dict[str, float], thresholds: Optional[Dict[str, float]] = None
+) -> List[str]:
+    """Keep the categories the classifier is confident about."""
+    if thresholds is None:
+        thresholds = load_thresholds()
+    return [
+        label for label, score in scores.items()
+        if score > thresholds.get(label, CONFIDENCE_THRESHOLD)
+    ]
+
+def format_analysis(requirements: List[str]) -> str:
+    """Format identified categories for display."""
+    response = "Based on your requirements, you're looking for:\n"
+    for category in requirements:
+        response += f"- {category.title()}\n"
+    return response
+
 def generate_response(classifier, prompt: str) -> str:
     """Generate response using the text classification model."""
     try:
-        # Define car categories/features to check against
-        categories = [
-            "family car", "long distance", "durable", "fuel efficient",
-            "luxury", "sporty", "budget friendly", "compact"
-        ]
-        
         # Check user's requirements against each category
-        results = []
         try:
             # Single classification for all categories
-            result = classifier(
-                sequences=prompt,
-                candidate_labels=categories,
-                multi_label=True
-            )
-            
-            # Extract categories with high confidence
-            for label, score in zip(result["labels"], result["scores"]):
-                if score > 0.7:
-                    results.append(label)
-                    
+            scores = classify_requirements(classifier, prompt)
         except Exception as e:
             return f"Classification error: {str(e)}"
         
+        # Extract categories with high confidence
+        results = select_requirements(scores)
         if not results:
-            return "I couldn't clearly identify your car preferences. Could you please be more specific about what you're looking for in a car?"
+            return UNCLEAR_MESSAGE
         
-        # Format the response
-        response = "Based on your requirements, you're looking for:\n"
-        for category in results:
-            response += f"- {category.title()}\n"
-        
-        return response
+        return format_analysis(results)
     except Exception as e:
         return f"Error generating response: {str(e)}"
 
@@ -77,45 +154,121 @@ def filter_cars(df: pd.DataFrame, requirements: List[str]) -> pd.DataFrame:
     
     return filtered_df
 
+def rank_cars(
+    df: pd.DataFrame, requirements: List[str], cues: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Sort cars so the best matches for the cues and requirements come first."""
+    columns, ascending = [], []
+    # Comparatives from a follow-up message take precedence
+    for cue in cues or []:
+        column, order = REFINEMENT_CUES[cue]
+        if column not in columns:
+            columns.append(column)
+            ascending.append(order)
+    
+    # Then earlier requirements when ordering by price
+    for requirement in requirements:
+        if requirement == "budget friendly" and "cost" not in columns:
+            columns.append("cost")
+            ascending.append(True)
+        elif requirement == "luxury" and "cost" not in columns:
+            columns.append("cost")
+            ascending.append(False)
+    
+    # Then prioritize newer cars with lower mileage
+    for column in ["age", "mileage"]:
+        if column not in columns:
+            columns.append(column)
+            ascending.append(True)
+    
+    # Unknown body types rank between sedans and wagons
+    sizes = df["body_type"].map(BODY_SIZES).fillna(1.5)
+    ranked = df.assign(size=sizes).sort_values(columns, ascending=ascending)
+    return ranked.drop(columns="size")
+
+def format_recommendations(analysis: str, cars: pd.DataFrame) -> str:
+    """Format the top matches for display."""
+    top_cars = cars.head(3)
+    response = (
+        f"{analysis}\n\nBased on these requirements, here are the best matches:\n\n"
+    )
+    
+    for i, (_, car) in enumerate(top_cars.iterrows(), 1):
+        response += (
+            f"{i}. {car['make'].title()} {car['model'].title()}\n"
+            f"   • {car['age']} years old\n"
+            f"   • {car['body_type'].title()}, {car['fuel_type'].title()} fuel\n"
+            f"   • {car['transmission_type'].title()} transmission\n"
+            f"   • {car['mileage']:,.0f} miles\n"
+            f"   • £{car['cost']:,.2f}\n\n"
+        )
+    
+    return response
+
 def get_car_recommendation(classifier, user_query: str, df: pd.DataFrame) -> str:
     """Generate car recommendations using the classification model."""
+    return get_conversational_recommendation(classifier, user_query, df)[0]
+
+def refinement_cues(prompt: str) -> List[str]:
+    """Find the comparatives in a message, in the order they appear."""
+    words = re.findall(r"[a-z]+", prompt.lower())
+    return list(dict.fromkeys(word for word in words if word in REFINEMENT_CUES))
+
+def get_conversational_recommendation(
+    classifier, user_query: str, df: pd.DataFrame, context: Optional[Dict] = None
+) -> Tuple[str, Optional[Dict]]:
+    """
+    Generate car recommendations that build on the previous turn.
+    
+    The context holds the previous turn's requirements and candidate cars. A
+    message containing a comparative such as "cheaper" or "newer" refines
+    them: only its own text is classified, the cached candidates are narrowed
+    by any new requirements and then re-ranked by the comparatives, instead of
+    filtering the full database. When the new requirements rule out every
+    cached candidate, the full database is searched with them instead.
+    
+    Returns the response and the context to pass into the next turn.
+    """
     try:
-        # Get user requirements analysis
-        analysis = generate_response(classifier, user_query)
-        if "couldn't clearly identify" in analysis:
-            return analysis
-            
-        # Extract requirements from analysis
-        requirements = [
-            line.strip("- ").lower() 
-            for line in analysis.split("\n") 
-            if line.startswith("-")
-        ]
-        
-        # Filter cars based on requirements
-        filtered_cars = filter_cars(df, requirements)
-        
-        if filtered_cars.empty:
-            return f"{analysis}\n\nI couldn't find any cars matching all your requirements. Try broadening your search criteria."
+        try:
+            scores = classify_requirements(classifier, user_query)
+        except Exception as e:
+            return f"Classification error: {str(e)}", context
         
-        # Sort by relevant criteria (prioritize newer cars with lower mileage)
-        filtered_cars = filtered_cars.sort_values(["age", "mileage"])
-        top_cars = filtered_cars.head(3)
+        new_requirements = select_requirements(scores)
+        cues = refinement_cues(user_query) if context else []
+        refining = bool(cues)
+        note = ""
+        if refining:
+            added = [r for r in new_requirements if r not in context["requirements"]]
+            requirements = context["requirements"] + added
+            candidates = filter_cars(context["candidates"], added)
+            if candidates.empty:
+                # The new requirements contradict the previous matches
+                refining = False
+                note = (
+                    "None of your previous matches fit that, so I searched again.\n\n"
+                )
+            else:
+                note = f"Refining your previous matches ({', '.join(cues)}).\n\n"
         
-        # Format response
-        response = f"{analysis}\n\nBased on these requirements, here are the best matches:\n\n"
+        if not refining:
+            if not new_requirements:
+                return UNCLEAR_MESSAGE, context
+            requirements = new_requirements
+            candidates = filter_cars(df, requirements)
         
-        for i, (_, car) in enumerate(top_cars.iterrows(), 1):
-            response += (
-                f"{i}. {car['make'].title()} {car['model'].title()}\n"
-                f"   • {car['age']} years old\n"
-                f"   • {car['body_type'].title()}, {car['fuel_type'].title()} fuel\n"
-                f"   • {car['transmission_type'].title()} transmission\n"
-                f"   • {car['mileage']:,.0f} miles\n"
-                f"   • £{car['cost']:,.2f}\n\n"
-            )
+        analysis = note + format_analysis(requirements)
+        if candidates.empty:
+            # Keep the previous matches so they can still be refined
+            return f"{analysis}\n\n{NO_MATCHES_MESSAGE}", context
         
-        return response
+        candidates = rank_cars(candidates, requirements, cues)
+        new_context = {
+            "requirements": requirements,
+            "candidates": candidates
+        }
+        return format_recommendations(analysis, candidates), new_context
 
     except Exception as e:
-        return f"Error generating recommendations: {str(e)}" 
\ No newline at end of file
+        return f"Error generating recommendations: {str(e)}", context
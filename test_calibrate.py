@@ -0,0 +1,120 @@
+"""Unit tests for threshold calibration and loading."""
+
+import json
+import random
+
+import pandas as pd
+import pytest
+
+from conftest import FakeClassifier
+from find_my_car import calibrate
+from find_my_car.recommender import CATEGORIES, CONFIDENCE_THRESHOLD, load_thresholds
+
+LABELLED = [
+    ("big family car", ["family car"]),
+    ("seven seats for the kids", ["family car"]),
+    ("something cheap", ["budget friendly"]),
+    ("a cheap family car", ["family car", "budget friendly"]),
+    ("show me everything", []),
+]
+
+def fake_scores(labelled, positive=0.6, negative=0.4):
+    """Scores that separate the expected labels at 0.5."""
+    return {
+        query: {
+            label: positive if label in labels else negative for label in CATEGORIES
+        }
+        for query, labels in labelled
+    }
+
+def test_fit_thresholds_separates_labels():
+    thresholds = calibrate.fit_thresholds(fake_scores(LABELLED), LABELLED)
+    assert 0.4 <= thresholds["family car"] < 0.6
+    assert 0.4 <= thresholds["budget friendly"] < 0.6
+    # No positive examples, so the default is kept
+    assert thresholds["luxury"] == CONFIDENCE_THRESHOLD
+
+def test_evaluate_reports_precision_recall_and_retries():
+    defaults = {label: CONFIDENCE_THRESHOLD for label in CATEGORIES}
+    report = calibrate.evaluate(fake_scores(LABELLED), LABELLED, defaults)
+    # Nothing clears 0.7, so every query needs a retry
+    assert report["retry_rate"] == 1.0
+    assert report["labels"]["family car"]["recall"] == 0.0
+
+    fitted = calibrate.fit_thresholds(fake_scores(LABELLED), LABELLED)
+    report = calibrate.evaluate(fake_scores(LABELLED), LABELLED, fitted)
+    assert report["labels"]["family car"]["precision"] == 1.0
+    assert report["labels"]["family car"]["recall"] == 1.0
+    assert report["retry_rate"] == pytest.approx(1 / 5)
+
+def test_evaluate_counts_empty_results_as_retries():
+    cars = pd.DataFrame({
+        "body_type": ["sedan"], "fuel_type": ["petrol"], "age": [2],
+        "mileage": [20000], "cost": [20000]
+    })
+    fitted = calibrate.fit_thresholds(fake_scores(LABELLED), LABELLED)
+    report = calibrate.evaluate(fake_scores(LABELLED), LABELLED, fitted, cars)
+    # Only "something cheap" finds a car
+    assert report["retry_rate"] == pytest.approx(4 / 5)
+
+def test_cross_validation_does_not_see_held_out_queries():
+    rng = random.Random(1)
+    labelled = [(f"query {i}", ["family car"] if i % 2 else []) for i in range(40)]
+    scores = {
+        query: {label: rng.random() for label in CATEGORIES} for query, _ in labelled
+    }
+    fitted = calibrate.fit_thresholds(scores, labelled)
+    in_sample = calibrate.evaluate(scores, labelled, fitted)
+    held_out = calibrate.cross_validate(scores, labelled, folds=5)
+    # Random scores only look informative when fitted and scored on the same queries
+    assert (
+        held_out["labels"]["family car"]["precision"]
+        < in_sample["labels"]["family car"]["precision"]
+    )
+
+def test_score_queries_caches_per_model_and_labels(tmp_path):
+    cache_path = str(tmp_path / "scores.json")
+    classifier = FakeClassifier()
+
+    calibrate.score_queries(["a", "b"], cache_path, classifier)
+    scores = calibrate.score_queries(["a", "b", "c"], cache_path, classifier)
+    assert classifier.texts == [["a", "b"], ["c"]]
+    assert set(scores["c"]) == set(CATEGORIES)
+
+    calibrate.score_queries(["a"], cache_path, classifier, model="other-model")
+    assert classifier.texts[-1] == ["a"]
+    with open(cache_path) as f:
+        assert len(json.load(f)) == 2
+
+def test_load_thresholds_from_config(monkeypatch, tmp_path):
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps({"thresholds": {"luxury": 0.5}}))
+    monkeypatch.setenv("FIND_MY_CAR_THRESHOLDS", str(path))
+    thresholds = load_thresholds()
+    assert thresholds["luxury"] == 0.5
+    assert thresholds["family car"] == CONFIDENCE_THRESHOLD
+
+def test_load_thresholds_ignores_malformed_config(monkeypatch, tmp_path):
+    path = tmp_path / "thresholds.json"
+    path.write_text(json.dumps({"luxury": 0.5}))
+    monkeypatch.setenv("FIND_MY_CAR_THRESHOLDS", str(path))
+    with pytest.warns(UserWarning, match="invalid thresholds file"):
+        thresholds = load_thresholds()
+    assert thresholds == {label: CONFIDENCE_THRESHOLD for label in CATEGORIES}
+
+def test_load_thresholds_without_config(monkeypatch, tmp_path):
+    monkeypatch.setenv("FIND_MY_CAR_THRESHOLDS", str(tmp_path / "missing.json"))
+    assert load_thresholds() == {label: CONFIDENCE_THRESHOLD for label in CATEGORIES}
+
+def test_cross_validation_reports_folds_used():
+    report = calibrate.cross_validate(fake_scores(LABELLED), LABELLED, folds=50)
+    assert report["folds"] == len(LABELLED)
+
+def test_corrupt_score_cache_is_rebuilt(tmp_path):
+    cache_path = tmp_path / "scores.json"
+    cache_path.write_text("{not json")
+
+    with pytest.warns(UserWarning, match="invalid score cache"):
+        scores = calibrate.score_queries(["a"], str(cache_path), FakeClassifier())
+    assert set(scores["a"]) == set(CATEGORIES)
+    assert json.loads(cache_path.read_text())
@@ -0,0 +1,28 @@
+"""Unit tests for the dataset profile."""
+
+import numpy as np
+
+from find_my_car.dataset_profile import build_profile, empty_profile, update_profile
+
+def test_incremental_update_matches_full_build(cars):
+    profile = build_profile(cars.iloc[:4])
+    update_profile(profile, cars.iloc[4:7])
+    update_profile(profile, cars.iloc[7:])
+    assert profile == build_profile(cars)
+
+def test_profile_contents(cars):
+    profile = build_profile(cars)
+    assert profile["rows"] == len(cars)
+    assert profile["counts"]["body_type"] == cars["body_type"].value_counts().to_dict()
+    assert profile["ranges"]["cost"] == (cars["cost"].min(), cars["cost"].max())
+    assert sum(profile["histograms"]["mileage"].values()) == len(cars)
+
+def test_empty_rows_leave_profile_unchanged(cars):
+    assert update_profile(empty_profile(), cars.iloc[:0]) == empty_profile()
+
+def test_all_missing_numeric_column_has_no_range(cars):
+    cars["cost"] = np.nan
+    profile = build_profile(cars)
+    assert profile["ranges"]["cost"] is None
+    assert profile["histograms"]["cost"] == {}
+    assert profile["ranges"]["age"] is not None
@@ -0,0 +1,88 @@
+"""Unit tests for the bounded chat history."""
+
+import pandas as pd
+import pytest
+
+from find_my_car.history import (
+    compact_history, estimate_size, model_memory_bytes, read_limit,
+    session_memory_bytes, summarize_message
+)
+
+ASSISTANT_REPLY = (
+    "Based on your requirements, you're looking for:\n"
+    "- Family Car\n"
+    "- Luxury\n"
+    "\n\nBased on these requirements, here are the best matches:\n\n"
+    "1. Volvo Xc90\n"
+)
+
+def test_summarize_user_message_truncates():
+    message = {"role": "user", "content": "a  family\ncar " * 30}
+    summary = summarize_message(message)
+    assert summary.startswith("You asked: a family car")
+    assert summary.endswith("...")
+    assert len(summary) == len("You asked: ") + 80
+
+def test_summarize_assistant_message_lists_categories():
+    summary = summarize_message({"role": "assistant", "content": ASSISTANT_REPLY})
+    assert summary == "Assistant identified: Family Car, Luxury"
+
+def test_summarize_assistant_message_without_categories():
+    message = {"role": "assistant", "content": "I couldn't clearly identify it.\nMore"}
+    summary = summarize_message(message)
+    assert summary == "Assistant: I couldn't clearly identify it."
+
+def test_compact_history_keeps_window():
+    messages = [{"role": "user", "content": f"query {i}"} for i in range(10)]
+    summary = []
+    compact_history(messages, summary, max_messages=4, max_summary_lines=3)
+    assert [m["content"] for m in messages] == [f"query {i}" for i in range(6, 10)]
+    assert summary == [f"You asked: query {i}" for i in range(3, 6)]
+
+def test_compact_history_within_window_is_unchanged():
+    messages = [{"role": "user", "content": "query"}]
+    summary = []
+    compact_history(messages, summary, max_messages=4)
+    assert len(messages) == 1
+    assert summary == []
+
+def test_session_memory_bytes_skips_missing_keys():
+    df = pd.DataFrame({"make": ["Toyota", "Honda"]})
+    state = {"df": df, "messages": []}
+    memory = session_memory_bytes(state, ["df", "messages", "context"])
+    assert set(memory) == {"df", "messages"}
+    assert memory["df"] == estimate_size(df) > 0
+
+def test_read_limit(monkeypatch):
+    monkeypatch.delenv("TEST_LIMIT", raising=False)
+    assert read_limit("TEST_LIMIT", 20) == 20
+    monkeypatch.setenv("TEST_LIMIT", "5")
+    assert read_limit("TEST_LIMIT", 20) == 5
+
+@pytest.mark.parametrize("value", ["0", "-3", "many"])
+def test_read_limit_rejects_invalid_values(monkeypatch, value):
+    monkeypatch.setenv("TEST_LIMIT", value)
+    with pytest.warns(UserWarning, match="Ignoring invalid TEST_LIMIT"):
+        assert read_limit("TEST_LIMIT", 20) == 20
+
+class FakeTensor:
+    def __init__(self, count, size):
+        self.count, self.size = count, size
+
+    def numel(self):
+        return self.count
+
+    def element_size(self):
+        return self.size
+
+class FakeModel:
+    def parameters(self):
+        return [FakeTensor(1000, 4), FakeTensor(10, 4)]
+
+    def buffers(self):
+        return [FakeTensor(5, 8)]
+
+def test_model_memory_bytes():
+    classifier = type("Pipeline", (), {"model": FakeModel()})()
+    assert model_memory_bytes(classifier) == 1000 * 4 + 10 * 4 + 5 * 8
+    assert model_memory_bytes(object()) == 0
@@ -0,0 +1,140 @@
+"""Unit tests for speculative classification."""
+
+import threading
+import time
+
+import pytest
+
+from conftest import FakeClassifier
+from find_my_car import prefetch
+from find_my_car.prefetch import Prefetcher, prefetch_key, real_requests_in_flight
+
+LABELS = ["family car", "luxury", "sporty", "compact"]
+
+def wait_until(condition, timeout=10):
+    """Wait for another thread to reach a state, failing after `timeout`."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+def submit_in_background(prefetcher, text, results):
+    """Submit a message from another thread once it is counted as in flight."""
+    thread = threading.Thread(
+        target=lambda: results.append(prefetcher(text, LABELS, True))
+    )
+    thread.start()
+    wait_until(lambda: real_requests_in_flight() == 1)
+    return thread
+
+@pytest.fixture(autouse=True)
+def drain_shared_pool():
+    yield
+    # Let speculation finish so tests don't share a busy worker
+    prefetch.shared_executor().submit(lambda: None).result(timeout=10)
+
+def test_prefetched_result_is_reused():
+    classifier = FakeClassifier(["luxury"])
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("I want a BMW", LABELS)
+    prefetcher.jobs[prefetch_key("I want a BMW", LABELS, True)][0].result()
+    assert len(classifier.calls) == 2
+
+    result = prefetcher("I want a BMW ", LABELS, True)
+    assert len(classifier.calls) == 2
+    assert result["labels"][0] == "luxury"
+    assert dict(zip(result["labels"], result["scores"])) == dict(
+        zip(LABELS, classifier.score("", LABELS)["scores"])
+    )
+
+def test_reuse_requires_exact_text():
+    classifier = FakeClassifier()
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("I want a BMW", LABELS)
+    prefetcher.jobs[prefetch_key("I want a BMW", LABELS, True)][0].result()
+
+    assert prefetcher("i want a bmw", LABELS, True)["sequence"] == "i want a bmw"
+    assert classifier.calls[-1] == ("i want a bmw", tuple(LABELS))
+
+def test_stale_drafts_are_cancelled():
+    classifier = FakeClassifier()
+    classifier.gate = threading.Event()
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("first draft", LABELS)
+    classifier.started.wait(timeout=10)
+    prefetcher.prefetch("second draft", LABELS)
+    prefetcher.prefetch("final draft", LABELS)
+    assert list(prefetcher.jobs) == [prefetch_key("final draft", LABELS, True)]
+
+    classifier.gate.set()
+    prefetcher("final draft", LABELS, True)
+    assert "second draft" not in classifier.texts
+    # The running job stopped after its first step
+    assert classifier.texts.count("first draft") == 1
+
+def test_submit_never_runs_alongside_stale_speculation():
+    classifier = FakeClassifier()
+    classifier.gate = threading.Event()
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("stale draft", LABELS)
+    classifier.started.wait(timeout=10)
+
+    results = []
+    thread = submit_in_background(prefetcher, "final draft", results)
+    classifier.gate.set()
+    thread.join(timeout=10)
+
+    assert classifier.max_active == 1
+    # The stale job stopped after its first step
+    assert classifier.texts == ["stale draft", "final draft"]
+    assert results[0]["sequence"] == "final draft"
+
+def test_submitted_draft_finishes_its_speculative_job():
+    classifier = FakeClassifier()
+    classifier.gate = threading.Event()
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("final draft", LABELS)
+    classifier.started.wait(timeout=10)
+
+    results = []
+    thread = submit_in_background(prefetcher, "final draft", results)
+    classifier.gate.set()
+    thread.join(timeout=10)
+
+    # Two speculative steps and no separate classification
+    assert classifier.texts == ["final draft", "final draft"]
+    assert sorted(results[0]["labels"]) == sorted(LABELS)
+
+def test_failed_speculation_falls_back_to_classifier():
+    classifier = FakeClassifier(fail={"flaky"})
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("flaky", LABELS)
+    job = prefetcher.jobs[prefetch_key("flaky", LABELS, True)][0]
+    with pytest.raises(RuntimeError):
+        job.result()
+
+    assert prefetcher("flaky", LABELS, True)["sequence"] == "flaky"
+    assert classifier.calls[-1] == ("flaky", tuple(LABELS))
+
+def test_no_speculation_while_any_session_has_a_real_request():
+    busy_classifier = FakeClassifier()
+    busy_classifier.gate = threading.Event()
+    busy_session = Prefetcher(busy_classifier)
+    results = []
+    thread = submit_in_background(busy_session, "real request", results)
+
+    other_classifier = FakeClassifier()
+    other_session = Prefetcher(other_classifier)
+    other_session.prefetch("draft", LABELS)
+    busy_classifier.gate.set()
+    thread.join(timeout=10)
+
+    assert other_session.jobs == {}
+    assert other_classifier.calls == []
+
+def test_single_label_mode_is_scored_in_one_call():
+    classifier = FakeClassifier()
+    prefetcher = Prefetcher(classifier)
+    prefetcher.prefetch("draft", LABELS, multi_label=False)
+    prefetcher.jobs[prefetch_key("draft", LABELS, False)][0].result()
+    assert classifier.calls == [("draft", tuple(LABELS))]
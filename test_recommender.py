@@ -0,0 +1,81 @@
+"""Unit tests for the recommendation logic, using a fake classifier."""
+
+import pytest
+
+from conftest import FakeClassifier
+from find_my_car.recommender import (
+    NO_MATCHES_MESSAGE, UNCLEAR_MESSAGE, get_car_recommendation,
+    get_conversational_recommendation, rank_cars, refinement_cues
+)
+
+@pytest.fixture(autouse=True)
+def default_thresholds(monkeypatch, tmp_path):
+    monkeypatch.setenv("FIND_MY_CAR_THRESHOLDS", str(tmp_path / "missing.json"))
+
+def recommend(labels, query, cars, context=None):
+    """Run one chat turn with a classifier confident about `labels`."""
+    classifier = FakeClassifier(labels)
+    return get_conversational_recommendation(classifier, query, cars, context)
+
+def test_refinement_cues_only_match_comparatives():
+    assert refinement_cues("Cheaper please, and newer") == ["cheaper", "newer"]
+    assert refinement_cues("I want a sporty luxury car but also fuel efficient") == []
+
+def test_rank_cars_by_size(cars):
+    ranked = rank_cars(cars, [], ["smaller"])
+    assert ranked["body_type"].iloc[0] == "sedan"
+    assert "size" not in ranked.columns
+
+def test_new_search_is_not_a_refinement(cars):
+    _, context = recommend(["family car"], "family car", cars)
+    response, context = recommend(
+        ["sporty", "luxury", "fuel efficient"],
+        "I want a sporty luxury car but also fuel efficient",
+        cars,
+        context
+    )
+    assert "Refining" not in response
+    assert "family car" not in context["requirements"]
+
+def test_cheaper_reranks_without_confident_category(cars):
+    _, context = recommend(["family car"], "family car", cars)
+    response, refined = recommend([], "cheaper please", cars, context)
+    assert response.startswith("Refining your previous matches (cheaper).")
+    assert refined["requirements"] == ["family car"]
+    assert len(refined["candidates"]) == len(context["candidates"])
+    assert refined["candidates"]["cost"].is_monotonic_increasing
+
+def test_refinement_narrows_cached_candidates(cars):
+    _, context = recommend(["family car"], "family car", cars)
+    _, refined = recommend(["budget friendly"], "cheaper please", cars, context)
+    assert refined["requirements"] == ["family car", "budget friendly"]
+    assert (refined["candidates"]["cost"] <= 30000).all()
+    assert refined["candidates"]["body_type"].isin(["suv", "wagon"]).all()
+
+def test_contradicting_refinement_searches_again(cars):
+    _, context = recommend(["luxury"], "luxury", cars)
+    query = "I want a cheaper compact car"
+    response, refined = recommend(["compact"], query, cars, context)
+    assert "searched again" in response
+    assert refined["requirements"] == ["compact"]
+    assert refined["candidates"]["model"].tolist() == ["Camry"]
+
+def test_failed_search_keeps_previous_matches(cars):
+    _, context = recommend(["luxury"], "luxury", cars)
+    response, kept = recommend(["luxury", "compact"], "luxury compact", cars, context)
+    assert NO_MATCHES_MESSAGE in response
+    assert kept is context
+
+    response, refined = recommend([], "cheaper", cars, kept)
+    assert response.startswith("Refining your previous matches (cheaper).")
+    assert refined["requirements"] == ["luxury"]
+
+def test_unclear_message_without_context(cars):
+    response, context = recommend([], "cheaper please", cars)
+    assert response == UNCLEAR_MESSAGE
+    assert context is None
+
+def test_get_car_recommendation_matches_conversation(cars):
+    classifier = FakeClassifier(["family car", "budget friendly"])
+    response = get_car_recommendation(classifier, "cheap family car", cars)
+    assert response == recommend(["family car", "budget friendly"], "x", cars)[0]